@@ -1,5 +1,21 @@
-from typing import List, Dict, Set, Optional, Tuple
+from typing import Any, Iterator, KeysView, List, Dict, Set, Optional, Tuple
+import sys
+from array import array
 from enum import Enum
+from types import MappingProxyType
+
+try:
+    from numba import njit
+except ImportError:
+    # Optional: without numba, descendant walks stay on the pure-Python DFS
+    njit = None
+
+# Shared empty results for adjacency lookups, avoid allocating a new container per miss
+EMPTY = ()
+EMPTY_DICT = MappingProxyType({})
+# Outgoing buckets get a destination set for duplicate checks once they grow past this
+# fanout; smaller buckets scan their destination list instead of paying for a set
+DEDUP_SET_THRESHOLD = 16
 
 class NodeType(Enum):
     # Enum of node types for type safety and consistency
@@ -31,13 +47,18 @@ class EdgeDirection(Enum):
     BOTH = 'both'
 
 class Node:
+    __slots__ = ('type', 'id', 'metadata', '_type_value', '_hash')
+    
     def __init__(self, type: NodeType, id: str, metadata: Dict = None):
         self.type = type
         self.id = id
         self.metadata = metadata if metadata is not None else {}
+        # Precomputed so hot loops skip the Enum .value lookup and tuple hashing
+        self._type_value = type.value
+        self._hash = hash((type, id))
     
     def __hash__(self):
-        return hash((self.type, self.id))
+        return self._hash
     
     def __eq__(self, other):
         if not isinstance(other, Node):
@@ -48,14 +69,43 @@ class Node:
         return f"Node(type={self.type}, id={self.id})"
 
 class Edge:
-    def __init__(self, src_node: Node, dst_node: Node, type: EdgeType, metadata: Dict = None):
+    __slots__ = ('src_node', 'dst_node', 'type', '_role', '_metadata', '_hash')
+    
+    def __init__(self, src_node: Node, dst_node: Node, type: EdgeType, metadata: Dict = None, role: Optional[str] = None):
         self.src_node = src_node
         self.dst_node = dst_node
         self.type = type
-        self.metadata = metadata if metadata is not None else {}
+        # The role is the only metadata read on hot paths, so it lives in its own slot.
+        # Metadata is copied in and handed out as a fresh copy so the two can never
+        # drift apart, and a dict is only kept when it carries anything besides the role
+        metadata = dict(metadata) if metadata else {}
+        if role is None:
+            role = metadata.get('role')
+        # Roles repeat across many edges, so share one string object per distinct role;
+        # non-string roles can't be interned and are stored as given
+        if isinstance(role, str):
+            role = sys.intern(role)
+        if role is not None:
+            metadata['role'] = role
+        self._role = role
+        self._metadata = metadata if metadata.keys() - {'role'} else None
+        # Precomputed like Node's hash; endpoints and type identify the edge
+        self._hash = hash((src_node, dst_node, type))
+    
+    @property
+    def role(self) -> Optional[str]:
+        return self._role
+    
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        # A copy, so writes to it never reach the edge; built on access for edges
+        # whose only metadata is the role
+        if self._metadata is not None:
+            return dict(self._metadata)
+        return {'role': self._role} if self._role is not None else {}
     
     def __hash__(self):
-        return hash((self.src_node, self.dst_node, self.type))
+        return self._hash
     
     def __eq__(self, other):
         if not isinstance(other, Edge):
@@ -68,96 +118,332 @@ class Edge:
         return f"Edge({self.src_node.id} -> {self.dst_node.id}, type={self.type})"
 
 
+def _descendants_csr_kernel(indptr, indices, start, visited, out, stack) -> int:
+    # Same depth-first order as Graph._iter_descendant_ids, over integers only so numba
+    # can compile it. Descendant ids go to out, stack is scratch; both hold every node id.
+    # Returns the number of descendants written to out
+    count = 0
+    depth = 1
+    stack[0] = start
+    visited[start] = 1
+    while depth:
+        depth -= 1
+        current = stack[depth]
+        for position in range(indptr[current], indptr[current + 1]):
+            child = indices[position]
+            if visited[child]:
+                continue
+            visited[child] = 1
+            out[count] = child
+            count += 1
+            stack[depth] = child
+            depth += 1
+    return count
+
+# Only used when it can be compiled; interpreted, it is no faster than the generator DFS
+_descendants_csr_kernel = njit(cache=True, nogil=True)(_descendants_csr_kernel) if njit is not None else None
+
+
+class _OutgoingBucket:
+    # Outgoing edges of one type from one node. Traversals read the parallel
+    # destination/role columns, with roles only kept for PERMISSION buckets; edges keeps
+    # the Edge objects so typed get_outgoing_edges stays a dict hit, and dst_set,
+    # built only for wide buckets, makes the duplicate check O(1)
+    __slots__ = ('dsts', 'roles', 'edges', 'dst_set')
+    
+    def __init__(self, with_roles: bool = False):
+        self.dsts: List[Node] = []
+        self.roles: Optional[List[str]] = [] if with_roles else None
+        self.edges: List[Edge] = []
+        self.dst_set: Optional[Set[Node]] = None
+
+# Shared empty bucket for outgoing lookups, backed by empty tuples so callers can't mutate it
+EMPTY_BUCKET = _OutgoingBucket(with_roles=True)
+EMPTY_BUCKET.dsts = EMPTY_BUCKET.roles = EMPTY_BUCKET.edges = EMPTY
+
+
 class Graph:    
     def __init__(self):
-        self.nodes: Set[Node] = set()
-        self.edges: Set[Edge] = set()
-        
         # Maintain adjacency lists for faster traversal
         self._outgoing_edges: Dict[Node, List[Edge]] = {}
         self._incoming_edges: Dict[Node, List[Edge]] = {}
         
-        # Node lookup by type and id for faster retrievals
-        self._node_lookup: Dict[Tuple[NodeType, str], Node] = {}
+        # Outgoing adjacency bucketed by edge type. Like the incoming buckets below, a node
+        # only gets an entry once it has an edge in that direction
+        self._out_by_type: Dict[Node, Dict[EdgeType, _OutgoingBucket]] = {}
+        # Incoming adjacency lists bucketed by edge type, so filtered lookups are a dict hit
+        self._in_by_type: Dict[Node, Dict[EdgeType, List[Edge]]] = {}
+        
+        # Memoized get_descendants results, cleared whenever the edge set changes
+        self._descendants_cache: Dict[Tuple[Node, EdgeType], Tuple[Node, ...]] = {}
+        # Memoized ancestor chains (nearest parent first), cleared on the same condition
+        self._ancestor_chain: Dict[Tuple[Node, EdgeType], Tuple[Node, ...]] = {}
+        
+        # Bumped on every inserted edge, so lazy walks can tell the graph changed under them
+        self._graph_version: int = 0
+        # Memoized permissions of known identities, cleared on the same condition
+        self._permissions_cache: Dict[Tuple[NodeType, str], Tuple[Tuple[str, str, str], ...]] = {}
+        
+        # Node lookup by type, then id, for faster retrievals without building key tuples
+        self._node_lookup: Dict[NodeType, Dict[str, Node]] = {}
+        
+        # Dense integer ids (0..n-1) assigned in insertion order, used by CSR traversals
+        self._id_of: Dict[Node, int] = {}
+        self._node_of: List[Node] = []
+        
+        # Lazily built CSR adjacency (indptr, indices) per edge type. New nodes extend it in
+        # place; a new edge of that type drops it, and traversals then walk the typed buckets
+        # until the work they did since that write would have paid for a rebuild
+        self._csr: Dict[EdgeType, Tuple[array, array]] = {}
+        self._csr_debt: Dict[EdgeType, int] = {}
+        # Reusable visited map for eager descendant walks, kept all-zero between calls.
+        # The busy flag marks it in use; a walk that finds it taken allocates its own map.
+        # Graph is not thread-safe for writes, this only keeps concurrent reads correct
+        self._visited_scratch = bytearray()
+        # Output and stack buffers for the compiled kernel, guarded by the same flag
+        self._kernel_out = array('l')
+        self._kernel_stack = array('l')
+        self._visited_busy = False
+    
+    @property
+    def nodes(self) -> KeysView[Node]:
+        # Live, set-like view of all nodes
+        return self._id_of.keys()
+    
+    @property
+    def edges(self) -> Set[Edge]:
+        # Snapshot of all edges, built on demand
+        return {edge for edges_from_node in self._outgoing_edges.values() for edge in edges_from_node}
     
     def add_node(self, node: Node) -> None:
-        if node not in self.nodes:
-            self.nodes.add(node)
-            self._node_lookup[(node.type, node.id)] = node
+        if node not in self._id_of:
+            self._node_lookup.setdefault(node.type, {})[node.id] = node
             self._outgoing_edges[node] = []
             self._incoming_edges[node] = []
+            self._id_of[node] = len(self._node_of)
+            self._node_of.append(node)
+            # The new node has no edges yet, so each CSR only needs an empty row
+            for indptr, _ in self._csr.values():
+                indptr.append(indptr[-1])
     
     def add_edge(self, edge: Edge) -> None:
         self.add_node(edge.src_node)
         self.add_node(edge.dst_node)
         
-        if edge not in self.edges:
-            self.edges.add(edge)
-            self._outgoing_edges[edge.src_node].append(edge)
-            self._incoming_edges[edge.dst_node].append(edge)
+        # Edges are unique per (src, dst, type)
+        buckets = self._out_by_type.get(edge.src_node)
+        if buckets is None:
+            buckets = self._out_by_type[edge.src_node] = {}
+        bucket = buckets.get(edge.type)
+        if bucket is None:
+            bucket = buckets[edge.type] = _OutgoingBucket(with_roles=edge.type is EdgeType.PERMISSION)
+        elif edge.dst_node in (bucket.dsts if bucket.dst_set is None else bucket.dst_set):
+            return
+        
+        # Edge interns its role on construction
+        role = edge.role
+        
+        bucket.dsts.append(edge.dst_node)
+        if bucket.dst_set is not None:
+            bucket.dst_set.add(edge.dst_node)
+        elif len(bucket.dsts) > DEDUP_SET_THRESHOLD:
+            bucket.dst_set = set(bucket.dsts)
+        bucket.edges.append(edge)
+        if bucket.roles is not None:
+            bucket.roles.append('' if role is None else role)
+        self._outgoing_edges[edge.src_node].append(edge)
+        self._incoming_edges[edge.dst_node].append(edge)
+        in_buckets = self._in_by_type.get(edge.dst_node)
+        if in_buckets is None:
+            in_buckets = self._in_by_type[edge.dst_node] = {}
+        in_buckets.setdefault(edge.type, []).append(edge)
+        # Only count traversal work done since the last write towards the next rebuild,
+        # so interleaved writes and small reads never pay for one
+        self._csr.pop(edge.type, None)
+        self._csr_debt[edge.type] = 0
+        self._graph_version += 1
+        # Any new edge can extend a cached subtree, so drop stale traversals
+        if self._descendants_cache:
+            self._descendants_cache.clear()
+        if self._ancestor_chain:
+            self._ancestor_chain.clear()
+        if self._permissions_cache:
+            self._permissions_cache.clear()
     
     def get_node(self, node_type: NodeType, node_id: str) -> Optional[Node]:
-        node = self._node_lookup.get((node_type, node_id))
+        node = self._node_lookup.get(node_type, EMPTY_DICT).get(node_id)
         return node
     
     
     def get_outgoing_edges(self, node: Node, edge_type: EdgeType = None) -> List[Edge]:
-        edges_from_node = self._outgoing_edges.get(node, [])
         if edge_type:
-            edges_from_node_by_type = [edge for edge in edges_from_node if edge.type == edge_type]
-            return edges_from_node_by_type
-        return edges_from_node
+            return self._out_by_type.get(node, EMPTY_DICT).get(edge_type, EMPTY_BUCKET).edges
+        return self._outgoing_edges.get(node, EMPTY)
     
     def get_incoming_edges(self, node: Node, edge_type: EdgeType = None) -> List[Edge]:
-        edges_into_node = self._incoming_edges.get(node, [])
         if edge_type:
-            edges_into_node_by_type = [edge for edge in edges_into_node if edge.type == edge_type]
-            return edges_into_node_by_type
-        return edges_into_node
-    
+            return self._in_by_type.get(node, EMPTY_DICT).get(edge_type, EMPTY)
+        return self._incoming_edges.get(node, EMPTY)
+    
+    
+    def _get_csr(self, edge_type: EdgeType) -> Optional[Tuple[array, array]]:
+        # Compressed sparse row view of outgoing edges of one type:
+        # children of node id v are indices[indptr[v]:indptr[v + 1]]
+        # Returns None while the CSR is stale and bucket walks are still cheaper than a rebuild
+        csr = self._csr.get(edge_type)
+        if csr is None and self._csr_debt.get(edge_type, 0) >= len(self._node_of):
+            id_of = self._id_of
+            indptr = array('l', [0])
+            indices = array('l')
+            for node in self._node_of:
+                indices.extend(id_of[dst] for dst in self._out_by_type.get(node, EMPTY_DICT).get(edge_type, EMPTY_BUCKET).dsts)
+                indptr.append(len(indices))
+            csr = (indptr, indices)
+            self._csr[edge_type] = csr
+            self._csr_debt[edge_type] = 0
+        return csr
+    
+    def _iter_descendant_ids(self, start: int, edge_type: EdgeType, visited: bytearray) -> Iterator[int]:
+        # Depth-first walk over dense node ids, marking each id in visited as it is yielded.
+        # Every descendant traversal goes through here so there is one DFS to maintain
+        csr = self._get_csr(edge_type)
+        if csr is not None:
+            indptr, indices = csr
+        else:
+            id_of = self._id_of
+            node_of = self._node_of
+            out_by_type = self._out_by_type
+        visited[start] = 1
+        stack = [start]
+        # Bind loop-invariant methods once instead of resolving them per iteration
+        stack_pop = stack.pop
+        stack_append = stack.append
+        walked = 0
+        # Ids, CSR slices and buckets all go stale once the graph is written to, so a
+        # suspended walk checks for writes before expanding the next node
+        version = self._graph_version
+        size = len(self._node_of)
+        
+        try:
+            while stack:
+                if self._graph_version != version or len(self._node_of) != size:
+                    raise RuntimeError("graph changed during iteration")
+                current = stack_pop()
+                walked += 1
+                # Find children (outgoing parent-child edges)
+                if csr is not None:
+                    children = indices[indptr[current]:indptr[current + 1]]
+                else:
+                    children = [id_of[dst] for dst in out_by_type.get(node_of[current], EMPTY_DICT).get(edge_type, EMPTY_BUCKET).dsts]
+                for child in children:
+                    if visited[child]:
+                        continue
+                    visited[child] = 1
+                    yield child
+                    stack_append(child)
+        finally:
+            if csr is None:
+                self._csr_debt[edge_type] = self._csr_debt.get(edge_type, 0) + walked
+    
+    def iter_descendants(self, node: Node, edge_type: EdgeType = EdgeType.PARENT_CHILD) -> Iterator[Node]:
+        # Lazily yield all descendants of a node by following parent-child relationships
+        start = self._id_of.get(node)
+        if start is None:
+            return iter(EMPTY)
+        node_of = self._node_of
+        return map(node_of.__getitem__, self._iter_descendant_ids(start, edge_type, bytearray(len(node_of))))
+    
+    def _collect_descendant_ids(self, start: int, edge_type: EdgeType) -> List[int]:
+        # Eagerly collect descendant ids using the shared visited map when it is free
+        size = len(self._node_of)
+        if self._visited_busy:
+            return list(self._iter_descendant_ids(start, edge_type, bytearray(size)))
+        self._visited_busy = True
+        visited = self._visited_scratch
+        found = None
+        try:
+            if len(visited) < size:
+                visited.extend(bytes(size - len(visited)))
+            csr = self._get_csr(edge_type) if _descendants_csr_kernel is not None else None
+            if csr is None:
+                found = list(self._iter_descendant_ids(start, edge_type, visited))
+                return found
+            out = self._kernel_out
+            stack = self._kernel_stack
+            if len(out) < size:
+                out.extend(bytes(size - len(out)))
+                stack.extend(bytes(size - len(stack)))
+            found = out[:_descendants_csr_kernel(csr[0], csr[1], start, visited, out, stack)].tolist()
+            return found
+        finally:
+            # Leave the map all-zero: reset only the touched entries, so small subtrees
+            # stay O(subtree), or the whole map if the walk failed part way
+            if found is None:
+                visited[:] = bytes(len(visited))
+            else:
+                visited[start] = 0
+                for child in found:
+                    visited[child] = 0
+            self._visited_busy = False
+    
+    def _cached_descendants(self, node: Node, edge_type: EdgeType) -> Tuple[Node, ...]:
+        # Shared, read-only descendants of a node; callers must not mutate the result
+        key = (node, edge_type)
+        cached = self._descendants_cache.get(key)
+        if cached is None:
+            start = self._id_of.get(node)
+            if start is None:
+                return EMPTY
+            # Run the whole walk on integer ids and only map back to nodes at the end
+            found = self._collect_descendant_ids(start, edge_type)
+            cached = tuple(map(self._node_of.__getitem__, found))
+            self._descendants_cache[key] = cached
+        return cached
     
     def get_descendants(self, node: Node, edge_type: EdgeType = EdgeType.PARENT_CHILD) -> List[Node]:
         # Get all descendants of a node by following parent-child relationships
-        descendants = []
-        visited = set()
-        stack = [node]
-        
-        while stack:
-            current = stack.pop()
-            if current in visited:
-                continue
-            visited.add(current)
-            
-            # Find children (outgoing parent-child edges)
-            children = self.get_neighbors(current, edge_type, EdgeDirection.OUTGOING)
-            for child in children:
-                if child not in visited:
-                    descendants.append(child)
-                    stack.append(child)
-        
-        return descendants
+        return list(self._cached_descendants(node, edge_type))
     
     def get_neighbors(self, node: Node, edge_type: EdgeType = None, direction: EdgeDirection = EdgeDirection.OUTGOING) -> list[Node]:
-        neighbors_set = set()
-        if direction in (EdgeDirection.OUTGOING, EdgeDirection.BOTH):
-            outgoing_edges = self.get_outgoing_edges(node, edge_type)
-            neighbors_set.update(edge.dst_node for edge in outgoing_edges)
-        if direction in (EdgeDirection.INCOMING, EdgeDirection.BOTH):
-            incoming_edges = self.get_incoming_edges(node, edge_type)
-            neighbors_set.update(edge.src_node for edge in incoming_edges)
-        neighbors = list(neighbors_set)
-        return neighbors
+        if direction is EdgeDirection.OUTGOING:
+            return self._neighbors_out(node, edge_type)
+        if direction is EdgeDirection.INCOMING:
+            return self._neighbors_in(node, edge_type)
+        return self._neighbors_both(node, edge_type)
+    
+    def _neighbors_out(self, node: Node, edge_type: EdgeType = None) -> List[Node]:
+        # A typed bucket already has unique destinations, so no dedup is needed
+        if edge_type:
+            return list(self._out_by_type.get(node, EMPTY_DICT).get(edge_type, EMPTY_BUCKET).dsts)
+        return list(dict.fromkeys(edge.dst_node for edge in self._outgoing_edges.get(node, EMPTY)))
     
-    def get_resource_hierarchy(self, node: Node, edge_type: EdgeType = EdgeType.PARENT_CHILD) -> List[Node]:
-        # Get all ancestors of a node by following parent-child relationships
-        ancestors = []
+    def _neighbors_in(self, node: Node, edge_type: EdgeType = None) -> List[Node]:
+        # A typed bucket already has unique sources, so no dedup is needed
+        if edge_type:
+            return [edge.src_node for edge in self._in_by_type.get(node, EMPTY_DICT).get(edge_type, EMPTY)]
+        return list(dict.fromkeys(edge.src_node for edge in self._incoming_edges.get(node, EMPTY)))
+    
+    def _neighbors_both(self, node: Node, edge_type: EdgeType = None) -> List[Node]:
+        return list(dict.fromkeys(self._neighbors_out(node, edge_type) + self._neighbors_in(node, edge_type)))
+    
+    def _ancestor_chain_of(self, node: Node, edge_type: EdgeType) -> Tuple[Node, ...]:
+        # Shared, read-only ancestors of a node; every node walked through gets its chain cached
+        chains = self._ancestor_chain
+        chain = chains.get((node, edge_type))
+        if chain is not None:
+            return chain
+        if node not in self._id_of:
+            return EMPTY
+        in_by_type = self._in_by_type
+        # A tree path visits each node at most once, so a longer walk means a cycle
+        max_depth = len(self._node_of)
+        # The starting node followed by the ancestors found so far
+        walked = [node]
         current = node
-        visited = set()
         
-        while current and current not in visited:
-            visited.add(current)
+        while True:
             # Find parent (incoming parent-child edge)
-            parent_edges = self.get_incoming_edges(current, edge_type)
+            parent_edges = in_by_type.get(current, EMPTY_DICT).get(edge_type, EMPTY)
             if len(parent_edges) > 1:
                 # Multiple parents detected - this violates tree structure
                 parent_ids = [edge.src_node.id for edge in parent_edges]
@@ -167,12 +453,31 @@ class Graph:
                 )
             elif len(parent_edges) == 1:
                 parent = parent_edges[0].src_node
-                ancestors.append(parent)
+                walked.append(parent)
+                # Stop early once we reach a node whose chain is already known
+                chain = chains.get((parent, edge_type))
+                if chain is not None:
+                    break
+                if len(walked) > max_depth:
+                    raise ValueError(
+                        f"Cycle detected above {node.type.value} '{node.id}'. "
+                        f"Tree structure expected for edge type {edge_type.value}"
+                    )
                 current = parent
             else:
+                chain = EMPTY
                 break
         
-        return ancestors
+        # Cache each prefix from the top down: chain(child) = (parent,) + chain(parent)
+        chains[(walked[-1], edge_type)] = chain
+        for i in range(len(walked) - 2, -1, -1):
+            chain = (walked[i + 1],) + chain
+            chains[(walked[i], edge_type)] = chain
+        return chain
+    
+    def get_resource_hierarchy(self, node: Node, edge_type: EdgeType = EdgeType.PARENT_CHILD) -> List[Node]:
+        # Get all ancestors of a node by following parent-child relationships
+        return list(self._ancestor_chain_of(node, edge_type))
     
     # TASK 2
     def get_resource_hierarchy_by_id(self, resource_type: NodeType, resource_id: str) -> List[Node]:
@@ -188,28 +493,57 @@ class Graph:
         # Get all permissions for an identity, including inherited permissions
         # Returns: List of (resource_name, resource_type, role) tuples
         
-        identity_node = self.get_node(identity_type, identity_id)
-        if not identity_node:
-            return []
+        key = (identity_type, identity_id)
+        cached = self._permissions_cache.get(key)
+        if cached is not None:
+            return list(cached)
         
         permissions = []
+        identity_node = self.get_node(identity_type, identity_id)
+        if not identity_node:
+            # Misses are not cached, so lookups of arbitrary ids can't grow the cache
+            return permissions
         
         # Get all direct permission assignments for this user
-        permission_edges = self.get_outgoing_edges(identity_node, EdgeType.PERMISSION)
+        bucket = self._out_by_type.get(identity_node, EMPTY_DICT).get(EdgeType.PERMISSION, EMPTY_BUCKET)
         
-        for edge in permission_edges:
-            resource = edge.dst_node
-            role = edge.metadata.get('role', '')
-            
+        for resource, role in zip(bucket.dsts, bucket.roles):
             # Add permission for the directly assigned resource
-            permissions.append((resource.id, resource.type.value, role))
+            permissions.append((resource.id, resource._type_value, role))
             
-            # Add inherited permissions for all descendants
-            descendants = self.get_descendants(resource, EdgeType.PARENT_CHILD)
-            for descendant in descendants:
-                permissions.append((descendant.id, descendant.type.value, role))
+            # Add inherited permissions for all descendants; extending from a list lets
+            # CPython size the result once instead of growing it per generated row
+            descendants = self._cached_descendants(resource, EdgeType.PARENT_CHILD)
+            permissions.extend([(descendant.id, descendant._type_value, role) for descendant in descendants])
         
+        self._permissions_cache[key] = tuple(permissions)
         return permissions
+    
+    def get_identities_permissions(self, identities: List[Tuple[NodeType, str]]) -> Dict[Tuple[NodeType, str], List[Tuple[str, str, str]]]:
+        # Get permissions for a batch of identities, keyed by (identity_type, identity_id)
+        # Resources shared between identities have their (name, type) rows built only once
+        resource_rows: Dict[Node, Tuple[Tuple[str, str], ...]] = {}
+        results = {}
+        
+        for identity_type, identity_id in identities:
+            identity_node = self.get_node(identity_type, identity_id)
+            permissions = []
+            results[(identity_type, identity_id)] = permissions
+            if not identity_node:
+                continue
+            
+            bucket = self._out_by_type.get(identity_node, EMPTY_DICT).get(EdgeType.PERMISSION, EMPTY_BUCKET)
+            for resource, role in zip(bucket.dsts, bucket.roles):
+                # The assigned resource followed by all of its descendants
+                rows = resource_rows.get(resource)
+                if rows is None:
+                    rows = ((resource.id, resource._type_value),)
+                    descendants = self._cached_descendants(resource, EdgeType.PARENT_CHILD)
+                    rows += tuple([(descendant.id, descendant._type_value) for descendant in descendants])
+                    resource_rows[resource] = rows
+                permissions.extend([(resource_id, resource_type, role) for resource_id, resource_type in rows])
+        
+        return results
 
 
 # ===============================================================================
@@ -386,6 +720,26 @@ def test_hierarchy_operations():
         print(f"  Expected descendants: {expected_descendants}")
         print(f"  Contains expected: {expected_descendants.issubset(actual_descendants)}")
         
+        # Test cached descendants and hierarchy pick up a child added after the query
+        new_project = Node(NodeType.PROJECT, "new-project")
+        graph.add_edge(Edge(folder_96505015065, new_project, EdgeType.PARENT_CHILD))
+        descendant_ids = [d.id for d in graph.get_descendants(folder_96505015065)]
+        print(f"Folder 96505015065 descendants after adding a child: {descendant_ids}")
+        print(f"  Contains new child: {'new-project' in descendant_ids}")
+        new_hierarchy = [node.id for node in graph.get_resource_hierarchy(new_project)]
+        expected_new_hierarchy = ["96505015065", "767216091627", "1066060271767"]
+        print(f"New project hierarchy: {new_hierarchy}")
+        print(f"  Match: {new_hierarchy == expected_new_hierarchy}")
+    
+    # Test cached hierarchy picks up a new root added above the organization
+    if org_node:
+        new_root = Node(NodeType.ORGANIZATION, "new-root")
+        graph.add_edge(Edge(new_root, org_node, EdgeType.PARENT_CHILD))
+        hierarchy = graph.get_resource_hierarchy_by_id(NodeType.FOLDER, "518729943705")
+        actual_hierarchy = [node.id for node in hierarchy]
+        print(f"Folder 518729943705 hierarchy after adding a root: {actual_hierarchy}")
+        print(f"  Match: {actual_hierarchy == expected_hierarchy + ['new-root']}")
+    
     print()
 
 def test_permission_inheritance():
@@ -400,6 +754,24 @@ def test_permission_inheritance():
     for resource, res_type, role in ron_permissions:
         print(f"  {resource} ({res_type}): {role}")
     
+    # Test batch lookup matches the per-identity results
+    identities = [(NodeType.USER, "ron@test.authomize.com"), (NodeType.GROUP, "reviewers@test.authomize.com")]
+    batch_permissions = graph.get_identities_permissions(identities)
+    batch_match = all(
+        sorted(batch_permissions[identity]) == sorted(graph.get_identity_permissions(*identity))
+        for identity in identities
+    )
+    print(f"Batch permissions match: {batch_match}")
+    
+    # Test cached permissions pick up a folder added after the query
+    folder_188906894377 = graph.get_node(NodeType.FOLDER, "188906894377")
+    if folder_188906894377:
+        graph.add_edge(Edge(folder_188906894377, Node(NodeType.FOLDER, "new-folder"), EdgeType.PARENT_CHILD))
+        ron_permissions = graph.get_identity_permissions(NodeType.USER, "ron@test.authomize.com")
+        new_folder_roles = sorted(role for resource, _, role in ron_permissions if resource == "new-folder")
+        print(f"Ron's permissions after adding a folder: {len(ron_permissions)} total")
+        print(f"  New folder roles: {new_folder_roles}")
+    
     print()
 
 def test_edge_cases():
@@ -412,6 +784,36 @@ def test_edge_cases():
     fake_permissions = graph.get_identity_permissions(NodeType.USER, "fake@user.com")
     print(f"Non-existent user permissions: {len(fake_permissions)}")
     
+    # Test an unknown user's permissions show up once they are granted one
+    fake_user = Node(NodeType.USER, "fake@user.com")
+    billing_account = graph.get_node(NodeType.BILLING_ACCOUNT, "01B2E0-10D255-037E4D")
+    graph.add_edge(Edge(fake_user, billing_account, EdgeType.PERMISSION, {'role': 'roles/billing.viewer'}))
+    fake_permissions = graph.get_identity_permissions(NodeType.USER, "fake@user.com")
+    print(f"User permissions after first grant: {fake_permissions}")
+    
+    # Test a cyclic hierarchy is rejected
+    cycle_graph = Graph()
+    folder_a = Node(NodeType.FOLDER, "a")
+    folder_b = Node(NodeType.FOLDER, "b")
+    cycle_graph.add_edge(Edge(folder_a, folder_b, EdgeType.PARENT_CHILD))
+    cycle_graph.add_edge(Edge(folder_b, folder_a, EdgeType.PARENT_CHILD))
+    try:
+        cycle_graph.get_resource_hierarchy(folder_a)
+        print("Cycle detected: False")
+    except ValueError as error:
+        print(f"Cycle detected: True ({error})")
+
+    # Test a lazy descendant walk fails loudly when the graph is written to mid-iteration
+    org_node = graph.get_node(NodeType.ORGANIZATION, "1066060271767")
+    descendants = graph.iter_descendants(org_node)
+    first_child = next(descendants)
+    graph.add_edge(Edge(first_child, Node(NodeType.PROJECT, "late-project"), EdgeType.PARENT_CHILD))
+    try:
+        list(descendants)
+        print("Write during iteration detected: False")
+    except RuntimeError as error:
+        print(f"Write during iteration detected: True ({error})")
+
     # Test node equality and hashing
     node1 = Node(NodeType.USER, "test@user.com")
     node2 = Node(NodeType.USER, "test@user.com")